@@ -6,19 +6,79 @@ Interactive Streamlit dashboard for analyzing slang terms.
 
 import streamlit as st
 import asyncio
-from collections import Counter
-from typing import Dict, Any
-import plotly.express as px
-
-from slang_analyzer import get_api_key, analyze_with_haiku, parse_with_sonnet
+from collections import Counter, OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import plotly.graph_objects as go
+
+from slang_analyzer import (
+    DEFAULT_MAX_CONCURRENCY,
+    MAX_CONNECTIONS,
+    ConcurrencyLimiter,
+    ResponseCache,
+    create_client,
+    get_api_key,
+    run_pipeline,
+)
 import anthropic
 
 
+# Analyses kept per session so switching back to a recent term is instant
+MAX_STORED_RESULTS = 8
+
+# Completed analyses are also saved to the response cache and shown again
+# for this long, including after the app restarts
+RESULTS_TTL = 24 * 3600
+
+
 st.set_page_config(
     page_title="WTAC - What's That Acronym, Claude?", page_icon="🤔", layout="wide"
 )
 
 
+@st.cache_resource
+def get_cache() -> ResponseCache:
+    """Shared on-disk response cache for all sessions."""
+    return ResponseCache()
+
+
+def get_results_lru() -> OrderedDict:
+    """This session's recent results, least recently used first."""
+    return st.session_state.setdefault("_results_lru", OrderedDict())
+
+
+def store_results(results_key: str, table: pa.Table):
+    """Add results to this session's LRU, evicting the oldest past the limit."""
+    results_lru = get_results_lru()
+    results_lru[results_key] = table
+    results_lru.move_to_end(results_key)
+    if len(results_lru) > MAX_STORED_RESULTS:
+        results_lru.popitem(last=False)
+
+
+def get_session_runtime(
+    api_key: str,
+) -> Tuple[asyncio.AbstractEventLoop, anthropic.AsyncAnthropic]:
+    """Event loop and API client reused across reruns of this session.
+
+    The client's HTTP connection pool is bound to the loop it first ran on,
+    so the loop is kept alongside it rather than calling asyncio.run() (which
+    creates and closes a new loop) on every click.
+    """
+    runtime = st.session_state.get("_runtime")
+    if runtime is None or runtime["api_key"] != api_key:
+        runtime = {
+            "api_key": api_key,
+            "loop": asyncio.new_event_loop(),
+            "client": create_client(api_key),
+        }
+        st.session_state["_runtime"] = runtime
+    return runtime["loop"], runtime["client"]
+
+
 def main():
     st.title("🤔 WTAC - What's That Acronym, Claude?")
     st.markdown("Discover what slang acronyms could stand for using Claude AI models")
@@ -44,6 +104,35 @@ def main():
             help="Number of times to run the analysis (each run = 1 Haiku generation + 1 Sonnet parsing)",
         )
 
+        max_concurrency = st.slider(
+            "Max concurrent requests:",
+            min_value=1,
+            # The session client's connection pool holds this many requests
+            max_value=MAX_CONNECTIONS,
+            value=DEFAULT_MAX_CONCURRENCY,
+            help="Upper bound on parallel API calls; lowered automatically when the rate limit is near",
+        )
+
+        single_pass = st.checkbox(
+            "Single pass (Haiku only)",
+            value=False,
+            help="Have Haiku return structured definitions directly instead of parsing its output with Sonnet: half the API calls, no Sonnet cost",
+        )
+
+        max_output_tokens = st.number_input(
+            "Output token budget:",
+            min_value=0,
+            value=0,
+            step=10_000,
+            help="Stop generating samples once this many output tokens are used; samples already generated are still parsed (0 = unlimited)",
+        )
+
+        use_cache = st.checkbox(
+            "Reuse cached responses",
+            value=True,
+            help="Reuse earlier API responses and saved results for this term instead of calling the API",
+        )
+
         analyze_button = st.button("🚀 Analyze", type="primary")
 
     # Main content
@@ -52,15 +141,19 @@ def main():
         return
 
     # Check if we have results in session state
-    results_key = f"results_{slang_term}_{sample_size}"
-
-    if analyze_button or results_key not in st.session_state:
+    mode = "single_pass" if single_pass else "two_pass"
+    results_key = f"results_{slang_term}_{sample_size}_{mode}"
+    results_lru = get_results_lru()
+
+    saved_key = ("results_table", slang_term, sample_size, mode)
+    if not analyze_button and results_key not in results_lru and use_cache:
+        saved = get_cache().get(saved_key, RESULTS_TTL)
+        if saved:
+            table = pa.Table.from_pydict(saved, schema=results_schema(slang_term))
+            store_results(results_key, table)
+
+    if analyze_button or results_key not in results_lru:
         if analyze_button:
-            # Clear previous results
-            for key in list(st.session_state.keys()):
-                if key.startswith("results_"):
-                    del st.session_state[key]
-
             # Run analysis
             with st.spinner("Setting up analysis..."):
                 try:
@@ -71,19 +164,46 @@ def main():
                     return
 
             # Run async analysis with progress
-            results = run_analysis_with_progress(slang_term, sample_size, api_key)
+            results = run_analysis_with_progress(
+                slang_term,
+                sample_size,
+                api_key,
+                get_cache() if use_cache else None,
+                max_concurrency,
+                single_pass,
+                max_output_tokens or None,
+            )
             if results:
-                st.session_state[results_key] = results
+                table = results_table(slang_term, results["parsed_results"])
+                store_results(results_key, table)
+                if results["budget_exceeded"]:
+                    st.warning(
+                        f"Output token budget reached after "
+                        f"{results['output_tokens']:,} tokens; showing "
+                        f"{table.num_rows} of {sample_size} results"
+                    )
+                elif use_cache:
+                    # Partial runs are not saved as the result for this size
+                    get_cache().set(saved_key, table.to_pydict())
             else:
                 st.error("Analysis failed. Please try again.")
                 return
 
     # Display results if we have them
-    if results_key in st.session_state:
-        display_results(slang_term, st.session_state[results_key])
-
-
-def run_analysis_with_progress(slang_term: str, sample_size: int, api_key: str):
+    if results_key in results_lru:
+        results_lru.move_to_end(results_key)
+        display_results(slang_term, results_lru[results_key])
+
+
+def run_analysis_with_progress(
+    slang_term: str,
+    sample_size: int,
+    api_key: str,
+    cache: Optional[ResponseCache] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    single_pass: bool = False,
+    max_output_tokens: Optional[int] = None,
+):
     """Run the analysis with Streamlit progress bars."""
 
     # Create progress containers
@@ -93,81 +213,230 @@ def run_analysis_with_progress(slang_term: str, sample_size: int, api_key: str):
     sonnet_progress = st.progress(0)
     sonnet_status = st.empty()
 
-    async def run_with_progress():
-        client = anthropic.AsyncAnthropic(api_key=api_key)
+    # Running tally of interpretations, filled in while results stream in
+    live_tally = st.empty()
+    live_counts = Counter()
+
+    loop, client = get_session_runtime(api_key)
+
+    progress_bars = {"haiku": haiku_progress, "sonnet": sonnet_progress}
+
+    # Redraw at most ~50 times per bar rather than on every completion
+    update_every = max(1, sample_size // 50)
 
-        try:
-            # Step 1: Haiku analysis
-            haiku_status.text(
-                "🎭 Claude 3.5 Haiku generating creative interpretations..."
+    def on_progress(stage: str, done: int, total: int):
+        if done % update_every == 0 or done >= total:
+            progress_bars[stage].progress(
+                min(done / total, 1.0), text=f"{done}/{total}"
             )
-            haiku_progress.progress(0.1)
 
-            haiku_results = await analyze_with_haiku(client, slang_term, sample_size)
-            haiku_progress.progress(1.0)
+    def on_parsed(parsed: Dict[str, Any]):
+        if parsed.get("primary_meaning") and "error" not in parsed:
+            live_counts[parsed["primary_meaning"]] += 1
+            if live_counts.total() % update_every == 0:
+                live_tally.markdown(
+                    "**Top interpretations so far:**\n"
+                    + "\n".join(
+                        f"- {meaning} ({count})"
+                        for meaning, count in live_counts.most_common(5)
+                    )
+                )
+
+    async def run_with_progress():
+        # One limit shared by both models
+        limiter = ConcurrencyLimiter(max_concurrency)
 
-            # Step 2: Sonnet parsing
+        # Haiku generation and Sonnet parsing run as a pipeline
+        haiku_status.text("🎭 Claude 3.5 Haiku generating creative interpretations...")
+        if single_pass:
+            sonnet_status.text("⏭️ Sonnet parsing skipped (single pass)")
+        else:
             sonnet_status.text(
                 "🧠 Claude 4 Sonnet parsing interpretations into structured data..."
             )
-            sonnet_progress.progress(0.1)
 
-            parsed_results = await parse_with_sonnet(client, haiku_results, slang_term)
-            sonnet_progress.progress(1.0)
-
-            return {"haiku_results": haiku_results, "parsed_results": parsed_results}
+        results = await run_pipeline(
+            client,
+            slang_term,
+            sample_size,
+            cache,
+            limiter,
+            on_progress,
+            single_pass,
+            on_parsed,
+            max_output_tokens,
+        )
+        haiku_progress.progress(1.0)
+        sonnet_progress.progress(1.0)
 
-        finally:
-            await client.close()
+        return results
 
-    # Run the async function
+    # Run the async function on the session's long-lived loop
     try:
-        results = asyncio.run(run_with_progress())
+        results = loop.run_until_complete(run_with_progress())
+        live_tally.empty()
         haiku_status.text("✅ Haiku generation complete!")
-        sonnet_status.text("✅ Sonnet parsing complete!")
+        if not single_pass:
+            sonnet_status.text("✅ Sonnet parsing complete!")
         return results
     except Exception as e:
         st.error(f"Error during analysis: {e}")
         return None
 
 
-def display_results(slang_term: str, results: Dict[str, Any]):
-    """Display the analysis results with interactive visualizations."""
+def results_schema(slang_term: str) -> pa.Schema:
+    """Columns of a results table: the meaning plus one per distinct letter."""
+    letters = dict.fromkeys(slang_term.lower())
+    return pa.schema(
+        [("primary_meaning", pa.string())]
+        + [(f"letter_{letter}", pa.string()) for letter in letters]
+    )
 
-    parsed_results = results["parsed_results"]
 
-    # Filter valid results
+def results_table(slang_term: str, parsed_results: List[Dict[str, Any]]) -> pa.Table:
+    """Valid parsed results as a compact Arrow table, one row per result.
+
+    Stored in session state instead of the raw Haiku text and a dict per
+    result; `table.to_pydict()` round-trips it through the response cache.
+    """
     valid_results = [
         r for r in parsed_results if r.get("primary_meaning") and "error" not in r
     ]
 
-    if not valid_results:
-        st.error("No valid results to display")
-        return
+    def as_text(value):
+        return None if value is None else str(value)
+
+    columns = {}
+    for field in results_schema(slang_term):
+        if field.name == "primary_meaning":
+            values = [r["primary_meaning"] for r in valid_results]
+        else:
+            letter = field.name.removeprefix("letter_")
+            values = [r.get("letter_breakdown", {}).get(letter) for r in valid_results]
+        columns[field.name] = [as_text(value) for value in values]
+
+    return pa.Table.from_pydict(columns, schema=results_schema(slang_term))
+
+
+def count_values(column: pa.ChunkedArray) -> pd.Series:
+    """Frequency-sorted counts of a string column, ignoring nulls.
+
+    Values are interned to integer ids by dictionary encoding and counted
+    with bincount; ties keep first-seen order, matching Counter.most_common.
+    """
+    encoded = pc.dictionary_encode(column.combine_chunks())
+    codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+    labels = encoded.dictionary.to_numpy(zero_copy_only=False)
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    return pd.Series(counts[order], index=labels[order])
+
+
+def table_bytes(table: pa.Table) -> bytes:
+    """Arrow IPC serialization of a table, used to hash it for st.cache_data."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@st.cache_data(max_entries=32, hash_funcs={pa.Table: table_bytes})
+def aggregate_results(table: pa.Table) -> Tuple[int, pd.Series, Dict[str, pd.Series]]:
+    """Count results, primary meanings and per-letter meanings.
+
+    Counts are Series sorted by frequency, indexed by meaning.
+    """
+    meaning_counts = count_values(table["primary_meaning"])
+    letter_counts = {
+        name.removeprefix("letter_"): count_values(table[name])
+        for name in table.column_names
+        if name.startswith("letter_")
+    }
+    return table.num_rows, meaning_counts, letter_counts
+
+
+def top_with_others(counts: pd.Series, limit: int, keep: int) -> List[Tuple[str, int]]:
+    """Top `limit` entries, folding all but the first `keep` into "Others"."""
+    top = list(counts.head(limit).items())
+
+    if len(top) > keep + 1:
+        # Group smaller ones into "Others"
+        displayed = top[:keep]
+        others_count = sum(count for _, count in top[keep:])
+        if others_count > 0:
+            displayed.append(("Others", others_count))
+        return displayed
+
+    return top
+
+
+@st.cache_data(max_entries=128)
+def pie_chart(
+    labels: Tuple[str, ...], values: Tuple[int, ...], title: str
+) -> go.Figure:
+    """Pie chart with percentages and labels drawn inside the slices."""
+    fig = go.Figure(
+        go.Pie(
+            labels=labels,
+            values=values,
+            textposition="inside",
+            textinfo="percent+label",
+        )
+    )
+    fig.update_layout(title=title, showlegend=False)
+    return fig
+
+
+def interpretations_pie(slang_term: str, meaning_counts: pd.Series):
+    """Pie chart of the top interpretations, or None if there are none."""
+    displayed = top_with_others(meaning_counts, 8, 5)  # Top 8 to avoid clutter
+    if not displayed:
+        return None
+
+    labels, values = zip(*displayed)
+    return pie_chart(labels, values, f"Distribution of {slang_term} Interpretations")
+
+
+@st.cache_data(max_entries=32)
+def letter_pies(letter_counts: Dict[str, pd.Series]) -> Dict[str, go.Figure]:
+    """Pie chart per letter, built once so switching letters is a lookup."""
+    pies = {}
+    for letter, counts in letter_counts.items():
+        displayed = top_with_others(counts, 6, 4)
+        if displayed:
+            labels, values = zip(*displayed)
+            pies[letter] = pie_chart(
+                labels, values, f"What '{letter.upper()}' stands for"
+            )
+    return pies
 
-    # Aggregate data
-    all_meanings = [r.get("primary_meaning", "") for r in valid_results]
-    meaning_counts = Counter(all_meanings)
 
-    # Letter breakdown aggregation
-    letter_aggregation = {}
-    for result in valid_results:
-        breakdown = result.get("letter_breakdown", {})
-        for letter, meaning in breakdown.items():
-            if letter not in letter_aggregation:
-                letter_aggregation[letter] = []
-            letter_aggregation[letter].append(meaning)
+@st.fragment
+def display_results(slang_term: str, table: pa.Table):
+    """Display the analysis results with interactive visualizations.
+
+    Runs as a fragment, so changing the selected letter reruns only this
+    section instead of the whole script.
+    """
+
+    valid_count, meaning_counts, letter_counts = aggregate_results(table)
+
+    if not valid_count:
+        st.error("No valid results to display")
+        return
 
     # Summary stats
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("Term", slang_term)
     with col2:
-        st.metric("Valid Results", len(valid_results))
+        st.metric("Valid Results", valid_count)
     with col3:
         st.metric("Unique Interpretations", len(meaning_counts))
     with col4:
-        most_common = meaning_counts.most_common(1)[0][0] if meaning_counts else "N/A"
+        most_common = meaning_counts.index[0] if len(meaning_counts) else "N/A"
         st.metric("Top Interpretation", "📊")
         st.caption(most_common[:30] + "..." if len(most_common) > 30 else most_common)
 
@@ -179,28 +448,8 @@ def display_results(slang_term: str, results: Dict[str, Any]):
     with col1:
         st.subheader("🥧 Top Interpretations")
 
-        # Create pie chart for top interpretations
-        top_meanings = meaning_counts.most_common(8)  # Top 8 to avoid clutter
-
-        if len(top_meanings) > 6:
-            # Group smaller ones into "Others"
-            displayed = top_meanings[:5]
-            others_count = sum(count for _, count in top_meanings[5:])
-            if others_count > 0:
-                displayed.append(("Others", others_count))
-        else:
-            displayed = top_meanings
-
-        if displayed:
-            labels, values = zip(*displayed)
-
-            fig = px.pie(
-                values=values,
-                names=labels,
-                title=f"Distribution of {slang_term} Interpretations",
-            )
-            fig.update_traces(textposition="inside", textinfo="percent+label")
-            fig.update_layout(showlegend=False)
+        fig = interpretations_pie(slang_term, meaning_counts)
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
 
     with col2:
@@ -215,32 +464,10 @@ def display_results(slang_term: str, results: Dict[str, Any]):
             key=f"letter_selector_{slang_term}",
         )
 
-        if selected_letter in letter_aggregation:
-            letter_meanings = letter_aggregation[selected_letter]
-            letter_counts = Counter(letter_meanings)
-
-            # Create pie chart for selected letter
-            if letter_counts:
-                top_letter_meanings = letter_counts.most_common(6)
-
-                if len(top_letter_meanings) > 5:
-                    displayed = top_letter_meanings[:4]
-                    others_count = sum(count for _, count in top_letter_meanings[4:])
-                    if others_count > 0:
-                        displayed.append(("Others", others_count))
-                else:
-                    displayed = top_letter_meanings
-
-                labels, values = zip(*displayed)
-
-                fig = px.pie(
-                    values=values,
-                    names=labels,
-                    title=f"What '{selected_letter.upper()}' stands for",
-                )
-                fig.update_traces(textposition="inside", textinfo="percent+label")
-                fig.update_layout(showlegend=False)
-                st.plotly_chart(fig, use_container_width=True)
+        # Create pie chart for selected letter
+        pies = letter_pies(letter_counts)
+        if selected_letter in pies:
+            st.plotly_chart(pies[selected_letter], use_container_width=True)
         else:
             st.info(f"No data available for letter '{selected_letter.upper()}'")
 
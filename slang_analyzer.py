@@ -5,10 +5,59 @@ Clean, focused analysis functions for slang term interpretation.
 """
 
 import os
+import re
+import json
+import random
+import hashlib
+import difflib
 import asyncio
-from typing import List, Dict, Any
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
 
 import anthropic
+import httpx
+
+
+HAIKU_MODEL = "claude-3-5-haiku-20241022"
+HAIKU_TEMPERATURE = 1.0
+SONNET_MODEL = "claude-sonnet-4-20250514"
+
+# Haiku results at least this similar reuse one Sonnet parse
+SIMILARITY_THRESHOLD = 0.95
+# Haiku results parsed per Sonnet request
+SONNET_BATCH_SIZE = 10
+
+# Output token caps, sized a little above typical responses: ~150 tokens for
+# a Haiku list, ~80 for one structured definition
+HAIKU_MAX_TOKENS = 220
+DEFINITION_MAX_TOKENS = 160
+
+# HTTP connection pool shared by all requests made through one client
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 32
+
+# Upper bound on in-flight API requests shared by both models
+DEFAULT_MAX_CONCURRENCY = 32
+
+# Retries for rate limits, overload and transient server/network errors
+MAX_ATTEMPTS = 5
+RETRY_INITIAL_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    # Not a subclass of InternalServerError, and not exported at the top
+    # level in every supported SDK version
+    anthropic._exceptions.OverloadedError,
+    anthropic.APIConnectionError,
+)
+# Error types that can arrive as an SSE event after a 200 response, which
+# the SDK raises as a plain APIStatusError
+RETRYABLE_ERROR_TYPES = {"overloaded_error", "api_error"}
+
+DEFAULT_CACHE_PATH = os.getenv("SLANG_CACHE_PATH", ".slang_cache.sqlite3")
 
 
 def get_api_key() -> str:
@@ -19,21 +68,363 @@ def get_api_key() -> str:
     return api_key
 
 
-async def analyze_single_haiku(
-    client: anthropic.AsyncAnthropic, slang_term: str
-) -> str:
-    """Single async call to Claude 3.5 Haiku."""
-    prompt = f"""What could the slang term "{slang_term}" stand for as an acronym? 
+def create_client(
+    api_key: str, max_connections: int = MAX_CONNECTIONS
+) -> anthropic.AsyncAnthropic:
+    """Create an async client with a pooled HTTP connection limit.
+
+    Reuse one client for every request so TCP/TLS connections are kept alive
+    between calls instead of being re-established. `max_connections` should
+    be at least the concurrency limit used with the client, or requests past
+    the pool size queue in httpx while the limiter counts them as in flight.
+    """
+    return anthropic.AsyncAnthropic(
+        api_key=api_key,
+        # Retries are handled by create_message so the limiter sees every 429
+        max_retries=0,
+        http_client=anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            )
+        ),
+    )
+
+
+class ResponseCache:
+    """On-disk JSON cache for API responses, backed by sqlite.
+
+    Single responses are stored by key with `get`/`set`; repeated samples of
+    the same prompt are appended one row each with `add_samples`.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(responses)")]
+        if "created_at" not in columns:
+            self._conn.execute(
+                "ALTER TABLE responses ADD COLUMN created_at REAL NOT NULL DEFAULT 0"
+            )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS samples (key TEXT NOT NULL, value TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS samples_key ON samples (key)")
+        self._conn.commit()
+
+    def get(self, key: tuple, max_age: Optional[float] = None) -> Any:
+        """Return the cached value for key, or None on a miss.
+
+        With `max_age` (seconds), entries stored longer ago count as misses.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?",
+                (json.dumps(key),),
+            ).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: tuple, value: Any) -> None:
+        """Store a JSON-serializable value under key."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (json.dumps(key), json.dumps(value), time.time()),
+            )
+            self._conn.commit()
+
+    def sample(self, key: tuple, n: int) -> List[Any]:
+        """Return up to n stored samples for key, drawn without replacement."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT value FROM samples WHERE key = ? ORDER BY random() LIMIT ?",
+                (json.dumps(key), n),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def add_samples(self, key: tuple, values: List[Any]) -> None:
+        """Append JSON-serializable samples under key."""
+        key_json = json.dumps(key)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO samples (key, value) VALUES (?, ?)",
+                [(key_json, json.dumps(value)) for value in values],
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ConcurrencyLimiter:
+    """Shared limit on in-flight requests, adapted to the account's rate limit.
+
+    Additive increase / multiplicative decrease: the limit grows by one per
+    successful response up to `max_concurrency`, and halves when the API
+    reports fewer remaining requests than are in flight or returns a 429.
+    Requests already in flight when the limit halves report the same
+    congestion, so it halves at most once until a request started after the
+    decrease signals again.
+
+    Entering the limiter returns a ticket for the request, to be passed back
+    with `on_response` and `on_rate_limited`.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self._active = 0
+        self._started = 0
+        self._last_decrease = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> int:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+            self._started += 1
+            return self._started
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    async def on_response(self, ticket: int, headers: httpx.Headers) -> None:
+        """Adjust the limit from the rate-limit headers of a response."""
+        remaining = headers.get("anthropic-ratelimit-requests-remaining")
+        if remaining is not None and int(remaining) < self._active:
+            self.on_rate_limited(ticket)
+        elif self.limit < self.max_concurrency:
+            async with self._condition:
+                self.limit += 1
+                self._condition.notify_all()
+
+    def on_rate_limited(self, ticket: int) -> None:
+        if ticket > self._last_decrease:
+            self.limit = max(1, self.limit // 2)
+            self._last_decrease = self._started
+
+
+class BudgetExceededError(Exception):
+    """Raised instead of sending a request once the token budget is spent."""
+
+
+class TokenBudget:
+    """Running output-token total for one analysis, with an optional ceiling."""
+
+    def __init__(self, max_output_tokens: Optional[int] = None):
+        self.max_output_tokens = max_output_tokens
+        self.output_tokens = 0
+
+    @property
+    def exceeded(self) -> bool:
+        return (
+            self.max_output_tokens is not None
+            and self.output_tokens >= self.max_output_tokens
+        )
+
+    def check(self) -> None:
+        if self.exceeded:
+            raise BudgetExceededError(
+                f"Output token budget of {self.max_output_tokens} exhausted"
+            )
+
+    def record(self, message: anthropic.types.Message) -> None:
+        self.output_tokens += message.usage.output_tokens
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request is worth sending again."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    body = getattr(error, "body", None)
+    if isinstance(body, dict) and isinstance(body.get("error"), dict):
+        return body["error"].get("type") in RETRYABLE_ERROR_TYPES
+    return False
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """Seconds to wait after failed attempt number `attempt` (1-based).
+
+    Honors the server's retry-after header when present, otherwise uses
+    exponential backoff with up to a second of random jitter.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers["retry-after"]), RETRY_MAX_DELAY)
+        except (KeyError, ValueError):
+            pass
+
+    delay = RETRY_INITIAL_DELAY * 2 ** (attempt - 1) + random.uniform(0, 1)
+    return min(delay, RETRY_MAX_DELAY)
+
+
+async def create_message(
+    client: anthropic.AsyncAnthropic,
+    limiter: ConcurrencyLimiter,
+    budget: Optional[TokenBudget] = None,
+    enforce_budget: bool = True,
+    **kwargs,
+) -> anthropic.types.Message:
+    """Stream a message from the Messages API under the shared concurrency limit.
+
+    Streaming means cancelling the awaiting task closes the connection and
+    stops generation, instead of paying for a response nobody will read.
+    Rate-limit, overload and connection errors, including error events sent
+    mid-stream, are retried up to
+    MAX_ATTEMPTS times; the concurrency slot is released while waiting. With
+    a budget, output tokens are recorded and, unless `enforce_budget` is
+    false, no request is sent once it is spent.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            async with limiter as ticket:
+                if budget is not None and enforce_budget:
+                    budget.check()
+                try:
+                    async with client.messages.stream(**kwargs) as stream:
+                        await limiter.on_response(ticket, stream.response.headers)
+                        message = await stream.get_final_message()
+                        if budget is not None:
+                            budget.record(message)
+                        return message
+                except anthropic.RateLimitError:
+                    limiter.on_rate_limited(ticket)
+                    raise
+        except anthropic.APIError as e:
+            if attempt == MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            await asyncio.sleep(retry_delay(attempt, e))
+
+
+def haiku_prompt(slang_term: str) -> str:
+    """Build the Haiku prompt; identical for every run of the same term."""
+    return f"""What could the slang term "{slang_term}" stand for as an acronym? 
 Give me 3-5 creative and plausible interpretations of what each letter could represent.
 Be imaginative but keep it reasonable for internet/text slang.
 
 Format your response as a simple list, one interpretation per line."""
 
+
+def structured_haiku_prompt(slang_term: str) -> str:
+    """Build the single-pass Haiku prompt, answered with the definition tool."""
+    return f"""What could the slang term "{slang_term}" stand for as an acronym?
+Be imaginative but keep it reasonable for internet/text slang.
+
+Record the single interpretation you find most plausible, including what each letter represents."""
+
+
+def haiku_cache_key(slang_term: str, structured: bool = False) -> tuple:
+    """Cache key for Haiku completions: (model, prompt, temperature bucket)."""
+    prompt = (
+        structured_haiku_prompt(slang_term) if structured else haiku_prompt(slang_term)
+    )
+    return (HAIKU_MODEL, prompt, round(HAIKU_TEMPERATURE, 1))
+
+
+def sonnet_cache_key(slang_term: str, haiku_result: str) -> tuple:
+    """Cache key for a Sonnet parse: the term plus a content hash of the input."""
+    digest = hashlib.blake2b(haiku_result.encode(), digest_size=16).hexdigest()
+    return (SONNET_MODEL, slang_term, digest)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip punctuation/whitespace differences for comparison."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def find_similar(
+    text: str, candidates: List[str], threshold: float = SIMILARITY_THRESHOLD
+) -> Optional[int]:
+    """Return the index of the first candidate at least `threshold` similar to text."""
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(text)
+    for i, candidate in enumerate(candidates):
+        matcher.set_seq1(candidate)
+        if (
+            matcher.real_quick_ratio() >= threshold
+            and matcher.quick_ratio() >= threshold
+            and matcher.ratio() >= threshold
+        ):
+            return i
+    return None
+
+
+def definition_schema(slang_term: str) -> Dict[str, Any]:
+    """JSON schema for one structured acronym definition of the slang term."""
+
+    # Create dynamic schema for the slang term
+    letter_properties = {}
+    for letter in slang_term.lower():
+        letter_properties[letter] = {
+            "type": "string",
+            "description": f"What the letter '{letter.upper()}' stands for in this acronym",
+        }
+
+    return {
+        "type": "object",
+        "properties": {
+            "term": {
+                "type": "string",
+                "description": "The slang term being analyzed",
+            },
+            "primary_meaning": {
+                "type": "string",
+                "description": "The full expansion of the acronym (e.g., 'You Only Live Once')",
+            },
+            "letter_breakdown": {
+                "type": "object",
+                "properties": letter_properties,
+                "required": list(letter_properties.keys()),
+                "description": "Breakdown of what each letter in the acronym stands for",
+            },
+        },
+        "required": ["term", "primary_meaning", "letter_breakdown"],
+    }
+
+
+def is_complete_definition(parsed: Dict[str, Any], slang_term: str) -> bool:
+    """Whether a definition has a meaning and an entry for every letter."""
+    breakdown = parsed.get("letter_breakdown")
+    return (
+        isinstance(parsed.get("primary_meaning"), str)
+        and bool(parsed["primary_meaning"])
+        and isinstance(breakdown, dict)
+        and all(
+            isinstance(breakdown.get(letter), str) and breakdown[letter]
+            for letter in slang_term.lower()
+        )
+    )
+
+
+async def analyze_single_haiku(
+    client: anthropic.AsyncAnthropic,
+    slang_term: str,
+    limiter: ConcurrencyLimiter,
+    budget: Optional[TokenBudget] = None,
+) -> str:
+    """Single async call to Claude 3.5 Haiku."""
+    prompt = haiku_prompt(slang_term)
+
     try:
-        message = await client.messages.create(
-            model="claude-3-5-haiku-20241022",
-            max_tokens=500,
-            temperature=1.0,
+        message = await create_message(
+            client,
+            limiter,
+            budget,
+            model=HAIKU_MODEL,
+            max_tokens=HAIKU_MAX_TOKENS,
+            temperature=HAIKU_TEMPERATURE,
+            # Stop at trailing blank lines rather than padding the list
+            stop_sequences=["\n\n\n"],
             messages=[{"role": "user", "content": prompt}],
         )
         return message.content[0].text
@@ -41,141 +432,547 @@ Format your response as a simple list, one interpretation per line."""
         return f"Error: {str(e)}"
 
 
-async def parse_single_sonnet(
-    client: anthropic.AsyncAnthropic, haiku_result: str, slang_term: str
+async def analyze_single_haiku_structured(
+    client: anthropic.AsyncAnthropic,
+    slang_term: str,
+    limiter: ConcurrencyLimiter,
+    budget: Optional[TokenBudget] = None,
 ) -> Dict[str, Any]:
-    """Single async call to Claude 4 Sonnet for parsing using tool calls."""
+    """Single async call to Claude 3.5 Haiku returning a structured definition.
 
-    # Create dynamic schema for the slang term
-    letter_properties = {}
-    for letter in slang_term.lower():
-        letter_properties[letter] = {
-            "type": "string",
-            "description": f"What the letter '{letter.upper()}' stands for in this acronym",
+    Used in single-pass mode: Haiku records its own best interpretation with
+    the tool, so no Sonnet parsing call is needed.
+    """
+    define_tool = {
+        "name": "parse_acronym_definition",
+        "description": "Record the most plausible definition of the acronym",
+        "input_schema": definition_schema(slang_term),
+    }
+
+    prompt = structured_haiku_prompt(slang_term)
+
+    try:
+        message = await create_message(
+            client,
+            limiter,
+            budget,
+            model=HAIKU_MODEL,
+            max_tokens=DEFINITION_MAX_TOKENS,
+            temperature=HAIKU_TEMPERATURE,
+            tools=[define_tool],
+            tool_choice={"type": "tool", "name": "parse_acronym_definition"},
+            messages=[{"role": "user", "content": prompt}],
+        )
+
+        # Tool input cut off at max_tokens is incomplete even if it parsed
+        if message.stop_reason == "max_tokens":
+            return {
+                "term": slang_term,
+                "primary_meaning": "Parse failed - truncated",
+                "error": "Response hit max_tokens",
+            }
+
+        # Extract tool call result
+        for content_block in message.content:
+            if content_block.type == "tool_use":
+                parsed = content_block.input
+                if not is_complete_definition(parsed, slang_term):
+                    return {
+                        "term": slang_term,
+                        "primary_meaning": "Parse failed - incomplete",
+                        "error": "Tool input missing required fields",
+                    }
+                return parsed
+
+        return {
+            "term": slang_term,
+            "primary_meaning": "Parse failed - no tool use",
+            "error": "No tool use in response",
         }
 
-    parse_tool = {
+    except Exception as e:
+        return {"term": slang_term, "primary_meaning": "Parse failed", "error": str(e)}
+
+
+def build_parse_tool(slang_term: str) -> Dict[str, Any]:
+    """Sonnet tool schema for parsing a batch of analyses of the slang term.
+
+    Depends only on the term, so build it once per analysis and pass it to
+    every parse_batch_sonnet call.
+    """
+
+    # Each entry is a definition plus the number of the analysis it came from
+    item_schema = definition_schema(slang_term)
+    item_schema["properties"] = {
+        "index": {
+            "type": "integer",
+            "description": "The number of the analysis being parsed",
+        },
+        **item_schema["properties"],
+    }
+    item_schema["required"] = ["index", *item_schema["required"]]
+
+    return {
         "name": "parse_acronym_definition",
-        "description": "Parse and structure an acronym definition",
+        "description": "Parse and structure a batch of acronym definitions",
         "input_schema": {
             "type": "object",
             "properties": {
-                "term": {
-                    "type": "string",
-                    "description": "The slang term being analyzed",
-                },
-                "primary_meaning": {
-                    "type": "string",
-                    "description": "The full expansion of the acronym (e.g., 'You Only Live Once')",
-                },
-                "letter_breakdown": {
-                    "type": "object",
-                    "properties": letter_properties,
-                    "required": list(letter_properties.keys()),
-                    "description": "Breakdown of what each letter in the acronym stands for",
+                "results": {
+                    "type": "array",
+                    "description": "One parsed definition per analysis, in order",
+                    "items": item_schema,
                 },
             },
-            "required": ["term", "primary_meaning", "letter_breakdown"],
+            "required": ["results"],
         },
     }
 
-    prompt = f"""Parse this interpretation of the slang term "{slang_term}" as an acronym.
 
-Analysis to parse:
-{haiku_result}
+def sonnet_instructions(slang_term: str) -> str:
+    """Static part of the Sonnet parsing prompt, sent ahead of the analyses."""
+    return f"""Parse each of the following interpretations of the slang term "{slang_term}" as an acronym.
+
+For each numbered analysis, extract the most likely meaning. If multiple interpretations are given, pick the most plausible one. Return exactly one entry per analysis, using the analysis number as its index."""
+
+
+async def parse_batch_sonnet(
+    client: anthropic.AsyncAnthropic,
+    haiku_results: List[str],
+    slang_term: str,
+    limiter: ConcurrencyLimiter,
+    parse_tool: Optional[Dict[str, Any]] = None,
+    instructions: Optional[str] = None,
+    budget: Optional[TokenBudget] = None,
+) -> List[Dict[str, Any]]:
+    """Single async call to Claude 4 Sonnet parsing a batch of results using tool calls.
+
+    `parse_tool` and `instructions` are built from the slang term when not
+    given; callers parsing many batches should build them once and pass them.
+    """
+    parse_tool = parse_tool or build_parse_tool(slang_term)
+
+    # Static instructions first, then the analyses for this batch
+    instructions = instructions or sonnet_instructions(slang_term)
 
-Extract the most likely meaning from this analysis. If multiple interpretations are given, pick the most plausible one."""
+    analyses = "\n\n".join(
+        f"Analysis {i}:\n{haiku_result}"
+        for i, haiku_result in enumerate(haiku_results, 1)
+    )
 
     try:
-        message = await client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=500,
+        message = await create_message(
+            client,
+            limiter,
+            budget,
+            # Parsing samples that were already paid for is always allowed
+            enforce_budget=False,
+            model=SONNET_MODEL,
+            max_tokens=DEFINITION_MAX_TOKENS * len(haiku_results),
             temperature=0.1,
             tools=[parse_tool],
             tool_choice={"type": "tool", "name": "parse_acronym_definition"},
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": instructions},
+                        {"type": "text", "text": analyses},
+                    ],
+                }
+            ],
         )
 
-        # Extract tool call result
+        # Extract tool call result, matching entries back by index
         for content_block in message.content:
             if content_block.type == "tool_use":
-                return content_block.input
+                entries = [
+                    entry
+                    for entry in content_block.input.get("results", [])
+                    if isinstance(entry, dict)
+                ]
+                # Tool input cut off at max_tokens is parsed partially, so the
+                # last entry may be missing fields or end mid-string
+                if message.stop_reason == "max_tokens" and entries:
+                    entries.pop()
 
-        return {
-            "term": slang_term,
-            "primary_meaning": "Parse failed - no tool use",
-            "letter_breakdown": {},
-        }
+                by_index = {}
+                for entry in entries:
+                    if "index" in entry and is_complete_definition(entry, slang_term):
+                        by_index[entry.pop("index")] = entry
+                return [
+                    by_index.get(
+                        i,
+                        {
+                            "term": slang_term,
+                            "primary_meaning": "Parse failed",
+                            "error": "Missing or incomplete in batch response",
+                        },
+                    )
+                    for i in range(1, len(haiku_results) + 1)
+                ]
+
+        return [
+            {
+                "term": slang_term,
+                "primary_meaning": "Parse failed - no tool use",
+                "letter_breakdown": {},
+            }
+            for _ in haiku_results
+        ]
 
     except Exception as e:
-        return {"term": slang_term, "primary_meaning": "Parse failed", "error": str(e)}
+        return [
+            {"term": slang_term, "primary_meaning": "Parse failed", "error": str(e)}
+            for _ in haiku_results
+        ]
+
+
+async def stream_haiku(
+    client: anthropic.AsyncAnthropic,
+    slang_term: str,
+    num_runs: int = 100,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[ConcurrencyLimiter] = None,
+    structured: bool = False,
+    budget: Optional[TokenBudget] = None,
+) -> AsyncIterator[Any]:
+    """Yield Claude 3.5 Haiku results for a slang term as they complete.
+
+    Results are text, or definition dicts when `structured` is set. With a
+    cache, previously stored completions for the same prompt are sampled
+    without replacement first; only the shortfall hits the API.
+
+    At most `limiter.limit` Haiku calls are outstanding at a time, and the
+    next starts only after the consumer has handled a finished one. Work the
+    consumer schedules on the same limiter, such as Sonnet batches, is then
+    queued ahead of the rest of the Haiku runs instead of behind all of them.
+    Once `budget` is exceeded no further calls are started, results that
+    already finished are still yielded and the remaining calls are cancelled.
+    """
+    cache_key = haiku_cache_key(slang_term, structured)
+    analyze_single = (
+        analyze_single_haiku_structured if structured else analyze_single_haiku
+    )
+
+    reused: List[Any] = []
+    if cache is not None:
+        reused = cache.sample(cache_key, num_runs)
+
+    # Run with limited concurrency
+    limiter = limiter or ConcurrencyLimiter()
+
+    # Runs not covered by the cache, started as earlier ones finish
+    to_start = num_runs - len(reused)
+    pending: set = set()
+
+    def start_more():
+        nonlocal to_start
+        while (
+            to_start
+            and len(pending) < limiter.limit
+            and not (budget is not None and budget.exceeded)
+        ):
+            pending.add(
+                asyncio.ensure_future(
+                    analyze_single(client, slang_term, limiter, budget)
+                )
+            )
+            to_start -= 1
+
+    valid_results = []
+    try:
+        for result in reused:
+            yield result
+
+        start_more()
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            if budget is not None and budget.exceeded:
+                # Keep everything already paid for; the rest is cancelled below
+                done |= {task for task in pending if task.done()}
+                pending -= done
+
+            for task in done:
+                result = task.result()
+
+                # Filter out error results
+                failed = (
+                    "error" in result if structured else result.startswith("Error:")
+                )
+                if not failed:
+                    valid_results.append(result)
+                    yield result
+
+            if budget is not None and budget.exceeded:
+                break
+            start_more()
+    finally:
+        for task in pending:
+            task.cancel()
+
+        # Keep whatever was paid for, even if the consumer stopped early
+        if cache is not None and valid_results:
+            cache.add_samples(cache_key, valid_results)
 
 
 async def analyze_with_haiku(
-    client: anthropic.AsyncAnthropic, slang_term: str, num_runs: int = 100
+    client: anthropic.AsyncAnthropic,
+    slang_term: str,
+    num_runs: int = 100,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[ConcurrencyLimiter] = None,
 ) -> List[str]:
     """Analyze slang term with Claude 3.5 Haiku."""
-    # Create tasks for all runs
-    tasks = [analyze_single_haiku(client, slang_term) for _ in range(num_runs)]
+    return [
+        result
+        async for result in stream_haiku(client, slang_term, num_runs, cache, limiter)
+    ]
 
-    # Run with limited concurrency
-    semaphore = asyncio.Semaphore(10)  # Max 10 concurrent requests
 
-    async def run_with_semaphore(task):
-        async with semaphore:
-            return await task
+class SonnetParser:
+    """Parse Haiku results with Claude 4 Sonnet as they arrive.
+
+    Results whose text was parsed before resolve from the cache, and
+    duplicates within the run (exact after normalization, or paraphrases
+    differing only in a few words) share a single parse. The rest are sent to Sonnet
+    `batch_size` per request; call `flush()` once no more results are coming.
+    """
+
+    def __init__(
+        self,
+        client: anthropic.AsyncAnthropic,
+        slang_term: str,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+        batch_size: int = SONNET_BATCH_SIZE,
+        budget: Optional[TokenBudget] = None,
+    ):
+        self.client = client
+        self.slang_term = slang_term
+        self.cache = cache
+        self.limiter = limiter or ConcurrencyLimiter()
+        self.batch_size = batch_size
+        self.budget = budget
+        self.parse_tool = build_parse_tool(slang_term)
+        self.instructions = sonnet_instructions(slang_term)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._representative_texts: List[str] = []
+        self._representative_futures: List[asyncio.Future] = []
+        self._futures_by_text: Dict[str, asyncio.Future] = {}
+        self._batch_tasks: List[asyncio.Task] = []
+
+    def submit(self, haiku_result: str) -> asyncio.Future:
+        """Schedule a Haiku result for parsing; the future resolves to its dict."""
+        if self.cache is not None:
+            cached = self.cache.get(sonnet_cache_key(self.slang_term, haiku_result))
+            if cached is not None:
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(cached)
+                return future
+
+        # Identical text (after normalization) reuses an earlier parse directly;
+        # otherwise collapse near-duplicates onto one representative each
+        text = normalize_text(haiku_result)
+        future = self._futures_by_text.get(text)
+        if future is None:
+            match = find_similar(text, self._representative_texts)
+            if match is not None:
+                future = self._representative_futures[match]
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._representative_texts.append(text)
+                self._representative_futures.append(future)
+                self._pending.append((haiku_result, future))
+                if len(self._pending) >= self.batch_size:
+                    self.flush()
+            self._futures_by_text[text] = future
+
+        return asyncio.ensure_future(self._resolve(haiku_result, future))
 
-    # Execute all tasks
-    results = await asyncio.gather(*[run_with_semaphore(task) for task in tasks])
+    def flush(self) -> None:
+        """Send any results still waiting for a full batch."""
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._batch_tasks.append(asyncio.ensure_future(self._parse_batch(batch)))
 
-    # Filter out error results
-    valid_results = [r for r in results if not r.startswith("Error:")]
-    return valid_results
+    def cancel(self) -> None:
+        """Cancel outstanding Sonnet requests."""
+        for task in self._batch_tasks:
+            task.cancel()
+
+    async def _parse_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        results = await parse_batch_sonnet(
+            self.client,
+            [text for text, _ in batch],
+            self.slang_term,
+            self.limiter,
+            self.parse_tool,
+            self.instructions,
+            self.budget,
+        )
+        for (_, future), parsed in zip(batch, results):
+            future.set_result(parsed)
+
+    async def _resolve(
+        self, haiku_result: str, future: asyncio.Future
+    ) -> Dict[str, Any]:
+        parsed = await asyncio.shield(future)
+        if (
+            self.cache is not None
+            and "error" not in parsed
+            and parsed.get("letter_breakdown")
+        ):
+            self.cache.set(sonnet_cache_key(self.slang_term, haiku_result), parsed)
+        return parsed
 
 
 async def parse_with_sonnet(
-    client: anthropic.AsyncAnthropic, haiku_results: List[str], slang_term: str
+    client: anthropic.AsyncAnthropic,
+    haiku_results: List[str],
+    slang_term: str,
+    cache: Optional[ResponseCache] = None,
+    batch_size: int = SONNET_BATCH_SIZE,
+    limiter: Optional[ConcurrencyLimiter] = None,
 ) -> List[Dict[str, Any]]:
-    """Parse each Haiku result with Claude 4 Sonnet."""
-    # Create tasks for all parsing jobs
-    tasks = [
-        parse_single_sonnet(client, haiku_result, slang_term)
-        for haiku_result in haiku_results
-    ]
+    """Parse each Haiku result with Claude 4 Sonnet, `batch_size` per request."""
+    parser = SonnetParser(client, slang_term, cache, limiter, batch_size)
+    tasks = [parser.submit(haiku_result) for haiku_result in haiku_results]
+    parser.flush()
+    return list(await asyncio.gather(*tasks))
 
-    # Run with limited concurrency
-    semaphore = asyncio.Semaphore(10)  # Max 10 concurrent requests
 
-    async def run_with_semaphore(task):
-        async with semaphore:
-            return await task
+async def run_pipeline(
+    client: anthropic.AsyncAnthropic,
+    slang_term: str,
+    num_runs: int,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[ConcurrencyLimiter] = None,
+    on_progress: Optional[Callable[[str, int, int], None]] = None,
+    single_pass: bool = False,
+    on_parsed: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_output_tokens: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Generate with Haiku and parse with Sonnet, overlapping the two stages.
 
-    # Execute all tasks
-    parsed_results = await asyncio.gather(*[run_with_semaphore(task) for task in tasks])
-    return parsed_results
+    Each Haiku result is handed to the Sonnet parser as soon as it completes,
+    so parsing starts with the first batch instead of after the last sample.
+    `on_progress(stage, done, total)` is called as "haiku" and "sonnet" work
+    completes, and `on_parsed(result)` with each parsed result so callers can
+    show partial results. With `single_pass`, Haiku returns structured
+    definitions itself and Sonnet is not called.
+
+    With `max_output_tokens`, no new Haiku requests are sent once the
+    analysis has generated that many output tokens. Samples already generated
+    are still parsed by Sonnet, whose tokens count toward the total but are
+    not cut off, so the result can overshoot the budget by the parsing cost.
+    The result reports `output_tokens` and `budget_exceeded`.
+    """
+    limiter = limiter or ConcurrencyLimiter()
+    budget = TokenBudget(max_output_tokens)
+
+    if single_pass:
+        parsed_results = []
+        async for parsed in stream_haiku(
+            client, slang_term, num_runs, cache, limiter, True, budget
+        ):
+            parsed_results.append(parsed)
+            if on_progress:
+                on_progress("haiku", len(parsed_results), num_runs)
+            if on_parsed:
+                on_parsed(parsed)
+
+        haiku_results = [r["primary_meaning"] for r in parsed_results]
+        return {
+            "haiku_results": haiku_results,
+            "parsed_results": parsed_results,
+            "output_tokens": budget.output_tokens,
+            "budget_exceeded": budget.exceeded,
+        }
+
+    parser = SonnetParser(client, slang_term, cache, limiter, budget=budget)
+    parse_tasks: List[asyncio.Future] = []
+    parsed_count = 0
+
+    def on_parse_done(task):
+        nonlocal parsed_count
+        if task.cancelled():
+            return
+        parsed_count += 1
+        if on_progress:
+            on_progress("sonnet", parsed_count, num_runs)
+        if on_parsed:
+            on_parsed(task.result())
+
+    haiku_results = []
+    try:
+        async for haiku_result in stream_haiku(
+            client, slang_term, num_runs, cache, limiter, budget=budget
+        ):
+            haiku_results.append(haiku_result)
+            task = parser.submit(haiku_result)
+            task.add_done_callback(on_parse_done)
+            parse_tasks.append(task)
+            if on_progress:
+                on_progress("haiku", len(haiku_results), num_runs)
+
+        parser.flush()
+        parsed_results = list(await asyncio.gather(*parse_tasks))
+    finally:
+        parser.cancel()
+        for task in parse_tasks:
+            task.cancel()
+
+    return {
+        "haiku_results": haiku_results,
+        "parsed_results": parsed_results,
+        "output_tokens": budget.output_tokens,
+        "budget_exceeded": budget.exceeded,
+    }
 
 
 # CLI version for backwards compatibility
-async def run_analysis(slang_term: str, sample_size: int):
+async def run_analysis(
+    slang_term: str,
+    sample_size: int,
+    use_cache: bool = True,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    single_pass: bool = False,
+    max_output_tokens: Optional[int] = None,
+):
     """Run the complete analysis pipeline."""
     api_key = get_api_key()
-    client = anthropic.AsyncAnthropic(api_key=api_key)
+    client = create_client(api_key, max(max_concurrency, MAX_CONNECTIONS))
+    cache = ResponseCache() if use_cache else None
+    limiter = ConcurrencyLimiter(max_concurrency)
 
     try:
         print(f"Analyzing '{slang_term}' with {sample_size} samples...")
 
-        # Generate interpretations
-        haiku_results = await analyze_with_haiku(client, slang_term, sample_size)
-        print(f"Generated {len(haiku_results)} interpretations")
-
-        # Parse results
-        parsed_results = await parse_with_sonnet(client, haiku_results, slang_term)
-        print(f"Parsed {len(parsed_results)} results")
+        # Generate interpretations and parse them as they arrive
+        results = await run_pipeline(
+            client,
+            slang_term,
+            sample_size,
+            cache,
+            limiter,
+            single_pass=single_pass,
+            max_output_tokens=max_output_tokens,
+        )
+        print(f"Generated {len(results['haiku_results'])} interpretations")
+        print(f"Parsed {len(results['parsed_results'])} results")
+        print(f"Used {results['output_tokens']} output tokens")
+        if results["budget_exceeded"]:
+            print("Stopped early: output token budget reached")
 
-        return {"haiku_results": haiku_results, "parsed_results": parsed_results}
+        return results
 
     finally:
         await client.close()
+        if cache is not None:
+            cache.close()
 
 
 def main():
@@ -189,11 +986,42 @@ def main():
     parser.add_argument(
         "--sample-size", type=int, default=50, help="Number of samples (default: 50)"
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help=f"Max concurrent API requests (default: {DEFAULT_MAX_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="Have Haiku return structured definitions directly, skipping Sonnet",
+    )
+    parser.add_argument(
+        "--max-output-tokens",
+        type=int,
+        default=None,
+        help="Stop generating samples once this many output tokens are used",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the API instead of reusing cached responses",
+    )
 
     args = parser.parse_args()
 
     try:
-        results = asyncio.run(run_analysis(args.slang_term, args.sample_size))
+        results = asyncio.run(
+            run_analysis(
+                args.slang_term,
+                args.sample_size,
+                not args.no_cache,
+                args.max_concurrency,
+                args.single_pass,
+                args.max_output_tokens,
+            )
+        )
 
         # Simple output
         valid_results = [r for r in results["parsed_results"] if "error" not in r]